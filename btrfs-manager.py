@@ -1,17 +1,42 @@
 #!/usr/bin/env python3
 """
 Btrfs Management Web Tool
-A Flask-based web interface for managing Btrfs filesystems and Snapper snapshots
+A Quart-based web interface for managing Btrfs filesystems and Snapper snapshots
 """
 
 import os
+import re
+import math
+import time
+import asyncio
+import functools
+import hashlib
+import collections
 import subprocess
-import json
+import orjson
+import csv
+import io
+import gzip
+import pwd
+import secrets
+import socket
+import jinja2
 import psutil
-from flask import Flask, render_template_string, jsonify, request
+from quart import Quart, Response, request
 from datetime import datetime
 
-app = Flask(__name__)
+try:
+    from dbus_next import BusType
+    from dbus_next.aio import MessageBus
+    from dbus_next.errors import DBusError
+except ImportError:
+    # Without dbus-next, snapshots are listed through the snapper CLI
+    MessageBus = None
+
+app = Quart(__name__)
+
+# Results of the get_* collectors, keyed by function name: (expiry, task)
+_cache = {}
 
 # HTML Template for the main page
 HTML_TEMPLATE = '''
@@ -161,175 +186,51 @@ HTML_TEMPLATE = '''
     </div>
 
     <script>
-        // Initial load
+        // The server pushes every table on connect and then periodically
         document.addEventListener('DOMContentLoaded', function() {
-            refreshAll();
-            setInterval(refreshAll, 30000); // Refresh every 30 seconds
+            const source = new EventSource('/api/stream');
+            source.onmessage = event => renderAll(JSON.parse(event.data));
         });
         
-        function refreshAll() {
-            refreshSysInfo();
-            refreshBtrfs();
-            refreshDevices();
-            refreshRaid();
-            refreshSnapshots();
-            refreshIo();
+        function renderAll(data) {
+            renderSysInfo(data.sysinfo);
+            ['btrfs', 'devices', 'raid', 'snapshots', 'io'].forEach(table => {
+                document.getElementById(`${table}-body`).innerHTML = data[table];
+            });
         }
         
-        function refreshSysInfo() {
-            fetch('/api/sysinfo')
-                .then(response => response.json())
-                .then(data => {
-                    document.getElementById('hostname').textContent = data.hostname;
-                    document.getElementById('uptime').textContent = data.uptime;
-                    document.getElementById('loadavg').textContent = data.loadavg.join(', ');
-                })
-                .catch(error => console.error('Error fetching sys info:', error));
+        function renderSysInfo(data) {
+            document.getElementById('hostname').textContent = data.hostname;
+            document.getElementById('uptime').textContent = data.uptime;
+            document.getElementById('loadavg').textContent = data.loadavg.join(', ');
+        }
+        
+        // Table rows are rendered server-side; swap them in with one assignment
+        function refreshTable(table) {
+            fetch(`/api/${table}.html`)
+                .then(response => response.text())
+                .then(html => { document.getElementById(`${table}-body`).innerHTML = html; })
+                .catch(error => console.error(`Error fetching ${table} rows:`, error));
         }
         
         function refreshBtrfs() {
-            fetch('/api/btrfs')
-                .then(response => response.json())
-                .then(data => {
-                    const tbody = document.getElementById('btrfs-body');
-                    tbody.innerHTML = '';
-                    data.forEach(fs => {
-                        const row = document.createElement('tr');
-                        row.innerHTML = `
-                            <td>${fs.id}</td>
-                            <td>${fs.label || '-'}</td>
-                            <td>${fs.uuid}</td>
-                            <td>${fs.devices.length}</td>
-                            <td>${formatBytes(fs.total_size)}</td>
-                            <td>${formatBytes(fs.used)}</td>
-                            <td>${formatBytes(fs.free)}</td>
-                            <td>${fs.status}</td>
-                            <td>${fs.mount_point || '-'}</td>
-                            <td>${fs.mount_options || '-'}</td>
-                            <td>
-                                <button class="btn" onclick="mountFs('${fs.uuid}')">Mount</button>
-                                <button class="btn" onclick="umountFs('${fs.uuid}')">Unmount</button>
-                            </td>
-                        `;
-                        tbody.appendChild(row);
-                    });
-                })
-                .catch(error => console.error('Error fetching btrfs info:', error));
+            refreshTable('btrfs');
         }
         
         function refreshDevices() {
-            fetch('/api/devices')
-                .then(response => response.json())
-                .then(data => {
-                    const tbody = document.getElementById('devices-body');
-                    tbody.innerHTML = '';
-                    data.forEach(dev => {
-                        const row = document.createElement('tr');
-                        row.innerHTML = `
-                            <td>${dev.name}</td>
-                            <td>${formatBytes(dev.size)}</td>
-                            <td>${dev.type}</td>
-                            <td>${dev.mount_point || '-'}</td>
-                            <td>${dev.fstype || '-'}</td>
-                            <td>${dev.model || '-'}</td>
-                            <td>${dev.serial || '-'}</td>
-                            <td>
-                                <button class="btn" onclick="addDeviceToBtrfs('${dev.name}')" ${dev.fstype === 'btrfs' ? '' : 'disabled'}>Add to Btrfs</button>
-                            </td>
-                        `;
-                        tbody.appendChild(row);
-                    });
-                })
-                .catch(error => console.error('Error fetching device info:', error));
+            refreshTable('devices');
         }
         
         function refreshRaid() {
-            fetch('/api/raid')
-                .then(response => response.json())
-                .then(data => {
-                    const tbody = document.getElementById('raid-body');
-                    tbody.innerHTML = '';
-                    data.forEach(raid => {
-                        const row = document.createElement('tr');
-                        row.innerHTML = `
-                            <td>${raid.fs}</td>
-                            <td>${raid.data_profile}</td>
-                            <td>${raid.metadata_profile}</td>
-                            <td>${formatBytes(raid.global_reserve)}</td>
-                            <td>
-                                <select id="raid-select-${raid.fs}">
-                                    <option value="">Change RAID...</option>
-                                    <option value="single">Single</option>
-                                    <option value="raid0">RAID0</option>
-                                    <option value="raid1">RAID1</option>
-                                    <option value="raid5">RAID5</option>
-                                    <option value="raid6">RAID6</option>
-                                    <option value="raid10">RAID10</option>
-                                </select>
-                                <button class="btn" onclick="changeRaid('${raid.fs}', document.getElementById('raid-select-${raid.fs}').value)">Apply</button>
-                            </td>
-                        `;
-                        tbody.appendChild(row);
-                    });
-                })
-                .catch(error => console.error('Error fetching RAID info:', error));
+            refreshTable('raid');
         }
         
         function refreshSnapshots() {
-            fetch('/api/snapshots')
-                .then(response => response.json())
-                .then(data => {
-                    const tbody = document.getElementById('snapshots-body');
-                    tbody.innerHTML = '';
-                    data.forEach(snap => {
-                        const row = document.createElement('tr');
-                        row.innerHTML = `
-                            <td>${snap.id}</td>
-                            <td>${snap.type}</td>
-                            <td>${snap.pre_num || '-'}</td>
-                            <td>${snap.description}</td>
-                            <td>${snap.date}</td>
-                            <td>${snap.user_name}</td>
-                            <td>${formatBytes(snap.used_space)}</td>
-                            <td>
-                                <button class="btn" onclick="deleteSnapshot('${snap.config}', ${snap.id})">Delete</button>
-                            </td>
-                        `;
-                        tbody.appendChild(row);
-                    });
-                })
-                .catch(error => console.error('Error fetching snapshots:', error));
+            refreshTable('snapshots');
         }
         
         function refreshIo() {
-            fetch('/api/io')
-                .then(response => response.json())
-                .then(data => {
-                    const tbody = document.getElementById('io-body');
-                    tbody.innerHTML = '';
-                    data.forEach(io => {
-                        const row = document.createElement('tr');
-                        row.innerHTML = `
-                            <td>${io.device}</td>
-                            <td>${io.read_count}</td>
-                            <td>${io.write_count}</td>
-                            <td>${formatBytes(io.read_bytes)}</td>
-                            <td>${formatBytes(io.write_bytes)}</td>
-                            <td>${io.read_time}</td>
-                            <td>${io.write_time}</td>
-                        `;
-                        tbody.appendChild(row);
-                    });
-                })
-                .catch(error => console.error('Error fetching IO stats:', error));
-        }
-        
-        function formatBytes(bytes) {
-            if (bytes === 0) return '0 Bytes';
-            const k = 1024;
-            const sizes = ['Bytes', 'KB', 'MB', 'GB', 'TB'];
-            const i = Math.floor(Math.log(bytes) / Math.log(k));
-            return parseFloat((bytes / Math.pow(k, i)).toFixed(2)) + ' ' + sizes[i];
+            refreshTable('io');
         }
         
         function mountFs(uuid) {
@@ -341,7 +242,7 @@ HTML_TEMPLATE = '''
                 })
                 .then(response => response.json())
                 .then(data => {
-                    alert(data.message);
+                    alert(data.message || data.error);
                     refreshBtrfs();
                 })
                 .catch(error => console.error('Error mounting filesystem:', error));
@@ -357,7 +258,7 @@ HTML_TEMPLATE = '''
                 })
                 .then(response => response.json())
                 .then(data => {
-                    alert(data.message);
+                    alert(data.message || data.error);
                     refreshBtrfs();
                 })
                 .catch(error => console.error('Error unmounting filesystem:', error));
@@ -375,7 +276,7 @@ HTML_TEMPLATE = '''
                     })
                     .then(response => response.json())
                     .then(data => {
-                        alert(data.message);
+                        alert(data.message || data.error);
                         refreshBtrfs();
                         refreshDevices();
                     })
@@ -389,12 +290,14 @@ HTML_TEMPLATE = '''
                 fetch('/api/change-raid', {
                     method: 'POST',
                     headers: {'Content-Type': 'application/json'},
-                    body: JSON.stringify({filesystem: fs, profile: newProfile})
+                    body: JSON.stringify({mount_point: fs, profile: newProfile})
                 })
                 .then(response => response.json())
                 .then(data => {
-                    alert(data.message);
-                    refreshRaid();
+                    alert(data.message || data.error);
+                    if (data.job_id) {
+                        waitForJob(data.job_id, refreshRaid);
+                    }
                 })
                 .catch(error => console.error('Error changing RAID profile:', error));
             }
@@ -409,7 +312,7 @@ HTML_TEMPLATE = '''
                 })
                 .then(response => response.json())
                 .then(data => {
-                    alert(data.message);
+                    alert(data.message || data.error);
                     refreshSnapshots();
                 })
                 .catch(error => console.error('Error deleting snapshot:', error));
@@ -427,9 +330,13 @@ HTML_TEMPLATE = '''
                 })
                 .then(response => response.json())
                 .then(data => {
-                    alert(data.message);
-                    refreshBtrfs();
-                    refreshDevices();
+                    alert(data.message || data.error);
+                    if (data.job_id) {
+                        waitForJob(data.job_id, () => {
+                            refreshBtrfs();
+                            refreshDevices();
+                        });
+                    }
                 })
                 .catch(error => console.error('Error creating Btrfs:', error));
             }
@@ -447,7 +354,7 @@ HTML_TEMPLATE = '''
                     })
                     .then(response => response.json())
                     .then(data => {
-                        alert(data.message);
+                        alert(data.message || data.error);
                         refreshSnapshots();
                     })
                     .catch(error => console.error('Error creating snapshot:', error));
@@ -455,6 +362,21 @@ HTML_TEMPLATE = '''
             }
         }
         
+        // Poll a background job until it ends, then report how it went
+        function waitForJob(jobId, onDone) {
+            fetch(`/api/job/${jobId}`)
+                .then(response => response.json())
+                .then(job => {
+                    if (job.status === 'running') {
+                        setTimeout(() => waitForJob(jobId, onDone), 2000);
+                    } else {
+                        alert(job.message || job.error);
+                        onDone();
+                    }
+                })
+                .catch(error => console.error('Error polling job:', error));
+        }
+        
         function changeRaidLevel() {
             // Implemented via the RAID table UI
             alert("Use the dropdown in the RAID table to change RAID levels.");
@@ -464,29 +386,115 @@ HTML_TEMPLATE = '''
 </html>
 '''
 
-def run_command(cmd):
-    """Run a shell command and return the output"""
+# The page has no template variables, so it is encoded once and served as-is
+INDEX_HTML = HTML_TEMPLATE.encode('utf-8')
+INDEX_HTML_GZIP = gzip.compress(INDEX_HTML, compresslevel=9)
+
+async def run_process(args):
+    """Run a command asynchronously and return a CompletedProcess with text output"""
+    proc = await asyncio.create_subprocess_exec(*args, stdout=asyncio.subprocess.PIPE,
+                                                stderr=asyncio.subprocess.PIPE)
+    stdout, stderr = await proc.communicate()
+    return subprocess.CompletedProcess(args, proc.returncode, stdout.decode(), stderr.decode())
+
+def ttl_cache(seconds=20):
+    """Cache a collector's result for `seconds`; concurrent callers share one run"""
+    def decorator(func):
+        name = func.__name__
+        
+        @functools.wraps(func)
+        async def wrapper():
+            now = time.monotonic()
+            entry = _cache.get(name)
+            if entry is None or entry[0] <= now:
+                entry = (now + seconds, asyncio.ensure_future(func()))
+                _cache[name] = entry
+            try:
+                # Shield so a disconnecting client can't cancel the shared run
+                return await asyncio.shield(entry[1])
+            except Exception:
+                if _cache.get(name) is entry:
+                    del _cache[name]
+                raise
+        return wrapper
+    return decorator
+
+def invalidate_cache(*names):
+    """Drop cached collector results after a mutating operation"""
+    for name in names:
+        _cache.pop(name, None)
+
+# Seconds a finished job stays available on /api/job/<job_id>
+JOB_RETENTION = 3600
+
+# Background jobs for slow commands (mkfs.btrfs, balance) by job id
+_jobs = {}
+_job_tasks = set()
+
+async def run_job(job_id, args, success, failure, caches):
+    """Run a job's command, record how it ended and drop stale caches"""
+    job = _jobs[job_id]
     try:
-        result = subprocess.run(cmd, shell=True, capture_output=True, text=True, check=True)
-        return result.stdout.strip()
-    except subprocess.CalledProcessError as e:
-        return f"Error: {e.stderr}"
+        result = await run_process(args)
+        if result.returncode == 0:
+            job.update(status='done', message=success)
+        else:
+            job.update(status='failed', error=f'{failure}: {result.stderr}')
+    except Exception as e:
+        job.update(status='failed', error=f'{failure}: {e}')
+    job['finished'] = time.monotonic()
+    invalidate_cache(*caches)
+
+def start_job(args, success, failure, *caches):
+    """Start a command in the background and return its job id"""
+    now = time.monotonic()
+    for job_id in [job_id for job_id, job in _jobs.items()
+                   if job.get('finished', now) + JOB_RETENTION < now]:
+        del _jobs[job_id]
+    job_id = secrets.token_hex(8)
+    _jobs[job_id] = {'status': 'running', 'command': ' '.join(args)}
+    task = asyncio.ensure_future(run_job(job_id, args, success, failure, caches))
+    # Hold a reference so the task is not garbage collected mid-run
+    _job_tasks.add(task)
+    task.add_done_callback(_job_tasks.discard)
+    return job_id
+
+# /proc files read on every sample, kept open between reads
+_proc_files = {}
 
-def get_system_info():
+def read_proc(path):
+    """Read a /proc file through a persistent handle"""
+    # The kernel regenerates the contents on each read from offset 0
+    f = _proc_files.get(path)
+    if f is None:
+        f = _proc_files[path] = open(path)
+    try:
+        f.seek(0)
+        return f.read()
+    except OSError:
+        del _proc_files[path]
+        f.close()
+        raise
+
+@functools.lru_cache(maxsize=None)
+def get_hostname():
+    """Get the hostname, which does not change while we run"""
+    return socket.gethostname()
+
+async def get_system_info():
     """Get basic system information"""
-    hostname = run_command("hostname")
+    hostname = get_hostname()
     
     # Get uptime
-    uptime_raw = run_command("cat /proc/uptime")
+    uptime_raw = read_proc('/proc/uptime')
     uptime_seconds = int(float(uptime_raw.split()[0]))
     days = uptime_seconds // 86400
     hours = (uptime_seconds % 86400) // 3600
     minutes = (uptime_seconds % 3600) // 60
     uptime = f"{days}d {hours}h {minutes}m"
     
-    # Get load average
-    loadavg_raw = run_command("cat /proc/loadavg")
-    loadavg = [float(x) for x in loadavg_raw.split()[:3]]
+    # Get load average; unlike os.getloadavg(), /proc/loadavg is rounded to two places
+    loadavg = [float(x) for x in read_proc('/proc/loadavg').split()[:3]]
     
     return {
         "hostname": hostname,
@@ -494,446 +502,810 @@ def get_system_info():
         "loadavg": loadavg
     }
 
-def get_btrfs_filesystems():
+# Parser for `btrfs filesystem show --raw`; each match is one line of interest
+FS_RE = re.compile(
+    r"^[ \t]*(?:"
+    r"Label:\s+(?:'(?P<label>.*)'|none)\s+uuid:\s+(?P<uuid>\S+)"
+    r"|Total devices\s+\d+\s+FS bytes used\s+(?P<fs_used>\d+)"
+    r"|devid\s+(?P<devid>\d+)\s+size\s+(?P<size>\d+)\s+used\s+(?P<used>\d+)\s+path\s+(?P<path>.+?)"
+    r"|(?P<missing>\*\*\* Some devices missing)"
+    r")[ \t]*$",
+    re.M
+)
+
+def device_for_uuid(uuid):
+    """Resolve a filesystem UUID to its device node through udev's by-uuid links"""
+    if not uuid or '/' in uuid:
+        return None
+    link = os.path.join('/dev/disk/by-uuid', uuid)
+    return os.path.realpath(link) if os.path.exists(link) else None
+
+# Octal escapes (e.g. \040 for a space) in /proc/self/mountinfo paths
+MOUNTINFO_ESCAPE_RE = re.compile(r'\\([0-7]{3})')
+
+def btrfs_device_uuids():
+    """Map the kernel name of each mounted btrfs member device to its filesystem UUID"""
+    uuids = {}
+    try:
+        with os.scandir('/sys/fs/btrfs') as entries:
+            for entry in entries:
+                devices = os.path.join(entry.path, 'devices')
+                if os.path.isdir(devices):
+                    for name in os.listdir(devices):
+                        uuids[name] = entry.name
+    except FileNotFoundError:
+        pass  # btrfs module not loaded, so nothing is mounted
+    return uuids
+
+@ttl_cache(seconds=2)
+async def get_btrfs_mounts():
+    """Map each mounted btrfs filesystem's UUID to its first mount in /proc/self/mountinfo"""
+    device_uuids = btrfs_device_uuids()
+    by_uuid = {}
+    
+    with open('/proc/self/mountinfo') as f:
+        for line in f:
+            fields = line.split()
+            # Optional fields end with a lone '-', followed by fstype, source and super options
+            separator = fields.index('-', 6)
+            fstype, source, super_options = fields[separator + 1:separator + 4]
+            if fstype != 'btrfs':
+                continue
+                
+            uuid = device_uuids.get(os.path.basename(os.path.realpath(source)))
+            if uuid is None or uuid in by_uuid:
+                continue
+                
+            options = dict.fromkeys(fields[5].split(',') + super_options.split(','))
+            by_uuid[uuid] = {
+                'target': MOUNTINFO_ESCAPE_RE.sub(lambda m: chr(int(m.group(1), 8)), fields[4]),
+                'source': source,
+                'options': ','.join(options),
+                'uuid': uuid
+            }
+    return by_uuid
+
+@ttl_cache(seconds=5)
+async def get_btrfs_filesystems():
     """Get information about Btrfs filesystems"""
     try:
-        # List all btrfs filesystems
-        cmd = "btrfs filesystem show"
-        result = subprocess.run(cmd, shell=True, capture_output=True, text=True)
+        # List all btrfs filesystems (sizes in bytes) and their mounts in one go
+        cmd = ['btrfs', 'filesystem', 'show', '--raw']
+        result, by_uuid = await asyncio.gather(run_process(cmd), get_btrfs_mounts())
         
         if result.returncode != 0:
             return []
             
-        output = result.stdout
         filesystems = []
         current_fs = None
         
-        for line in output.split('\n'):
-            line = line.strip()
-            if line.startswith('Label:'):
-                # Extract label, uuid, and other info from the line
-                parts = line.split()
-                if len(parts) >= 4:
-                    label = parts[1].strip("'")
-                    uuid = parts[3]
-                    current_fs = {
-                        'label': label,
-                        'uuid': uuid,
-                        'id': len(filesystems) + 1,
-                        'devices': [],
-                        'total_size': 0,
-                        'used': 0,
-                        'free': 0,
-                        'status': 'active',
-                        'mount_point': '',
-                        'mount_options': ''
-                    }
-                    
-                    # Find mount point
-                    try:
-                        mount_result = subprocess.run(f"findmnt -t btrfs -n -o TARGET,SOURCE | grep '{uuid}'", 
-                                                     shell=True, capture_output=True, text=True)
-                        if mount_result.returncode == 0:
-                            mount_parts = mount_result.stdout.strip().split()
-                            if mount_parts:
-                                current_fs['mount_point'] = mount_parts[0]
-                                
-                                # Get mount options
-                                opts_result = subprocess.run(f"findmnt -t btrfs -n -o OPTIONS,SOURCE | grep '{uuid}'", 
-                                                             shell=True, capture_output=True, text=True)
-                                if opts_result.returncode == 0:
-                                    opts_parts = opts_result.stdout.strip().split()
-                                    if opts_parts:
-                                        current_fs['mount_options'] = opts_parts[0]
-                    except:
-                        pass
-                        
-            elif line.startswith('Total devices:') or line.startswith('devid') or line.startswith('Device location:'):
-                # Parse device information
-                if current_fs:
-                    # Simple parsing - in a real implementation we'd parse more details
-                    if 'devid' in line:
-                        current_fs['devices'].append(line)
-                        
-            elif line.startswith('*** Some devices missing'):
-                if current_fs:
-                    current_fs['status'] = 'degraded'
-                    
-            elif line == '' and current_fs:
-                # End of current filesystem info
+        for match in FS_RE.finditer(result.stdout):
+            if match.group('uuid'):
+                uuid = match.group('uuid')
+                mount = by_uuid.get(uuid, {})
+                current_fs = {
+                    'label': match.group('label') or '',
+                    'uuid': uuid,
+                    'id': len(filesystems) + 1,
+                    'devices': [],
+                    'total_size': 0,
+                    'used': 0,
+                    'free': 0,
+                    'status': 'active',
+                    'mount_point': mount.get('target') or '',
+                    'mount_options': mount.get('options') or ''
+                }
                 filesystems.append(current_fs)
-                current_fs = None
+            elif not current_fs:
+                continue
+            elif match.group('devid'):
+                size = int(match.group('size'))
+                current_fs['devices'].append({
+                    'devid': int(match.group('devid')),
+                    'size': size,
+                    'used': int(match.group('used')),
+                    'path': match.group('path')
+                })
+                current_fs['total_size'] += size
+            elif match.group('fs_used'):
+                current_fs['used'] = int(match.group('fs_used'))
+            else:
+                current_fs['status'] = 'degraded'
                 
-        # If we still have a current filesystem at the end
-        if current_fs:
-            filesystems.append(current_fs)
-            
-        # Get size information for each filesystem
         for fs in filesystems:
-            try:
-                size_info = subprocess.run(f"btrfs filesystem usage -T {fs['mount_point'] or '/tmp'}", 
-                                           shell=True, capture_output=True, text=True)
-                if size_info.returncode == 0:
-                    for sline in size_info.stdout.split('\n'):
-                        if 'Data' in sline or 'Metadata' in sline or 'System' in sline:
-                            # Parse size information
-                            parts = sline.split()
-                            if len(parts) >= 3 and 'Size:' in sline:
-                                # Simplified parsing
-                                break
-            except:
-                pass
-                
+            fs['free'] = max(fs['total_size'] - fs['used'], 0)
+            
         return filesystems
     except Exception as e:
         print(f"Error getting Btrfs filesystems: {e}")
         return []
 
-def get_block_devices():
+# KEY="value" pairs of `lsblk -P`; unsafe characters in values are \xNN-escaped
+LSBLK_PAIR_RE = re.compile(r'(\S+?)="([^"]*)"')
+LSBLK_ESCAPE_RE = re.compile(r'\\x([0-9a-fA-F]{2})')
+
+# Our own operations invalidate this; the TTL only bounds hot-plug latency
+@ttl_cache(seconds=30)
+async def get_block_devices():
     """Get information about block devices"""
     try:
-        cmd = "lsblk -J -o NAME,SIZE,TYPE,MOUNTPOINT,FSTYPE,MODEL,SERIAL"
-        result = subprocess.run(cmd, shell=True, capture_output=True, text=True)
+        cmd = ['lsblk', '-P', '-b', '-o', 'NAME,SIZE,TYPE,MOUNTPOINT,FSTYPE,MODEL,SERIAL']
+        result = await run_process(cmd)
         
         if result.returncode != 0:
             return []
             
-        data = json.loads(result.stdout)
         devices = []
         
-        def extract_devices(blockdevices, parent=""):
-            for device in blockdevices:
-                name = device.get('name', '')
-                if parent:
-                    name = f"{parent}{name}"
-                
-                dev_info = {
-                    'name': name,
-                    'size': parse_size(device.get('size', '0')),
-                    'type': device.get('type', ''),
-                    'mount_point': device.get('mountpoint', ''),
-                    'fstype': device.get('fstype', ''),
-                    'model': device.get('model', ''),
-                    'serial': device.get('serial', '')
-                }
-                devices.append(dev_info)
-                
-                # Process children recursively
-                if 'children' in device:
-                    extract_devices(device['children'], f"{name}")
-        
-        if 'blockdevices' in data:
-            extract_devices(data['blockdevices'])
+        # One line per device, parents before their children
+        for line in result.stdout.splitlines():
+            device = dict(LSBLK_PAIR_RE.findall(line))
+            if '\\x' in line:
+                device = {key: LSBLK_ESCAPE_RE.sub(lambda m: chr(int(m.group(1), 16)), value)
+                          for key, value in device.items()}
+            
+            devices.append({
+                'name': device.get('NAME', ''),
+                'size': int(device.get('SIZE') or 0),
+                'type': device.get('TYPE', ''),
+                'mount_point': device.get('MOUNTPOINT', ''),
+                'fstype': device.get('FSTYPE', ''),
+                'model': device.get('MODEL', ''),
+                'serial': device.get('SERIAL', '')
+            })
             
         return devices
     except Exception as e:
         print(f"Error getting block devices: {e}")
         return []
 
-def parse_size(size_str):
-    """Convert size string to bytes"""
-    if not size_str or size_str == '0':
-        return 0
-    
-    units = {'B': 1, 'K': 1024, 'M': 1024**2, 'G': 1024**3, 'T': 1024**4}
-    
-    size_str = size_str.upper().strip()
-    for unit, multiplier in units.items():
-        if size_str.endswith(unit):
-            try:
-                num = float(size_str[:-1])
-                return int(num * multiplier)
-            except ValueError:
-                return 0
-    
-    return 0
+# Lines of `btrfs filesystem df -b`, for btrfs-progs without JSON output
+FS_DF_RE = re.compile(r"^(?P<type>\w+), (?P<profile>\w+): total=(?P<total>\d+), used=\d+", re.M)
 
-def get_raid_status():
+async def get_block_group_profiles(mount_point):
+    """Map each block group type (Data, Metadata, ...) of a mounted filesystem to (profile, total bytes)"""
+    result = await run_process(['btrfs', '--format=json', 'filesystem', 'df', mount_point])
+    if result.returncode == 0:
+        return {group['bg-type']: (group['bg-profile'].lower(), int(group['total']))
+                for group in orjson.loads(result.stdout).get('filesystem-df', [])}
+        
+    # btrfs-progs before 6.1 has no JSON output for df
+    result = await run_process(['btrfs', 'filesystem', 'df', '-b', mount_point])
+    if result.returncode != 0:
+        return {}
+    return {match.group('type'): (match.group('profile').lower(), int(match.group('total')))
+            for match in FS_DF_RE.finditer(result.stdout)}
+
+@ttl_cache(seconds=5)
+async def get_raid_status():
     """Get RAID status for Btrfs filesystems"""
     try:
-        cmd = "btrfs filesystem show"
-        result = subprocess.run(cmd, shell=True, capture_output=True, text=True)
-        
-        if result.returncode != 0:
-            return []
+        # Profiles are only reported for mounted filesystems; reuse the cached listing
+        mounted = [fs for fs in await get_btrfs_filesystems() if fs['mount_point']]
+        results = await asyncio.gather(*(get_block_group_profiles(fs['mount_point']) for fs in mounted))
         
         raid_info = []
-        lines = result.stdout.split('\n')
-        
-        for line in lines:
-            if 'Label:' in line:
-                # Extract filesystem info
-                parts = line.split()
-                if len(parts) >= 4:
-                    uuid = parts[3]
-                    raid_info.append({
-                        'fs': uuid,
-                        'data_profile': 'single',  # Default, would be parsed from actual output
-                        'metadata_profile': 'single',
-                        'global_reserve': 0
-                    })
-        
-        # For now, return placeholder data until we implement proper parsing
-        return [{
-            'fs': 'main-filesystem',
-            'data_profile': 'single',
-            'metadata_profile': 'single', 
-            'global_reserve': 0
-        }]
+        for fs, profiles in zip(mounted, results):
+            if not profiles:
+                continue
+            raid_info.append({
+                'fs': fs['mount_point'],
+                'uuid': fs['uuid'],
+                'data_profile': profiles.get('Data', ('-', 0))[0],
+                'metadata_profile': profiles.get('Metadata', ('-', 0))[0],
+                'global_reserve': profiles.get('GlobalReserve', ('-', 0))[1]
+            })
+            
+        return raid_info
     except Exception as e:
         print(f"Error getting RAID status: {e}")
         return []
 
-def get_snapshots():
+SNAPPER_SERVICE = 'org.opensuse.Snapper'
+SNAPPER_PATH = '/org/opensuse/Snapper'
+SNAPPER_TYPES = {0: 'single', 1: 'pre', 2: 'post'}
+
+# System bus connection and snapperd's D-Bus interface, connected on first use
+_bus = None
+_snapper = None
+
+async def get_snapper_interface():
+    """Get the snapperd D-Bus interface, connecting to the system bus once"""
+    global _bus, _snapper
+    if _snapper is None:
+        if _bus is None:
+            _bus = await MessageBus(bus_type=BusType.SYSTEM).connect()
+        introspection = await _bus.introspect(SNAPPER_SERVICE, SNAPPER_PATH)
+        proxy = _bus.get_proxy_object(SNAPPER_SERVICE, SNAPPER_PATH, introspection)
+        _snapper = proxy.get_interface(SNAPPER_SERVICE)
+    return _snapper
+
+def drop_snapper_interface():
+    """Disconnect from the system bus so the next call reconnects"""
+    global _bus, _snapper
+    if _bus is not None:
+        _bus.disconnect()
+    _bus = _snapper = None
+
+@functools.lru_cache(maxsize=None)
+def user_name(uid):
+    """Resolve a uid to a user name, falling back to the number"""
+    try:
+        return pwd.getpwuid(uid).pw_name
+    except KeyError:
+        return str(uid)
+
+@ttl_cache(seconds=30)
+async def get_snapshots():
     """Get Snapper snapshots"""
+    if MessageBus is not None:
+        try:
+            return await get_snapshots_dbus()
+        except Exception as e:
+            drop_snapper_interface()
+            print(f"Error getting snapshots over D-Bus, using the snapper CLI: {e}")
+    return await get_snapshots_cli()
+
+async def get_used_space_dbus(snapper, config, numbers):
+    """Map snapshot numbers of a configuration to their exclusive size in bytes"""
+    try:
+        # snapperd can only calculate used space with btrfs quota enabled and
+        # reports an error otherwise; older snapperd lacks the methods entirely
+        await snapper.call_calculate_used_space(config)
+        sizes = await asyncio.gather(*(snapper.call_get_used_space(config, number)
+                                       for number in numbers))
+    except (DBusError, AttributeError):
+        return {}
+    return dict(zip(numbers, sizes))
+
+async def get_snapshots_dbus():
+    """Get Snapper snapshots from snapperd over D-Bus"""
+    snapper = await get_snapper_interface()
+    configs = [config[0] for config in await snapper.call_list_configs()]
+    
+    # List every configuration's snapshots concurrently
+    results = await asyncio.gather(*(snapper.call_list_snapshots(config) for config in configs))
+    
+    # Snapshot 0 is the live filesystem, which has no used space of its own
+    used_spaces = await asyncio.gather(*(
+        get_used_space_dbus(snapper, config, [snapshot[0] for snapshot in config_snapshots
+                                              if snapshot[0]])
+        for config, config_snapshots in zip(configs, results)))
+    
+    snapshots = []
+    for config, config_snapshots, used_space in zip(configs, results, used_spaces):
+        for number, snap_type, pre_number, date, uid, description, _cleanup, _userdata in config_snapshots:
+            snapshots.append({
+                'id': str(number),
+                'type': SNAPPER_TYPES.get(snap_type, str(snap_type)),
+                'pre_num': str(pre_number) if pre_number else None,
+                'description': description,
+                'date': datetime.fromtimestamp(date).strftime('%Y-%m-%d %H:%M:%S') if date > 0 else '',
+                'user_name': user_name(uid),
+                'used_space': used_space.get(number),
+                'config': config
+            })
+    return snapshots
+
+async def get_snapshots_cli():
+    """Get Snapper snapshots through the snapper CLI"""
     try:
         # First, list available configurations
-        configs_output = run_command("snapper list-configs")
-        configs = []
+        result = await run_process(['snapper', '--csvout', '--no-headers', 'list-configs',
+                                    '--columns', 'config'])
+        if result.returncode != 0:
+            return []
+        configs = [row[0] for row in csv.reader(io.StringIO(result.stdout)) if row]
         
-        lines = configs_output.split('\n')
-        for line in lines[1:]:  # Skip header
-            parts = line.strip().split()
-            if parts:
-                configs.append(parts[0])
+        # List every configuration's snapshots concurrently
+        columns = 'number,type,pre-number,date,user,used-space,description'
+        results = await asyncio.gather(
+            *(run_process(['snapper', '--csvout', '--no-headers', '-c', config, 'list',
+                           '--columns', columns]) for config in configs),
+            return_exceptions=True
+        )
         
         snapshots = []
-        for config in configs:
-            try:
-                snaps_output = run_command(f"snapper -c {config} list")
-                snap_lines = snaps_output.split('\n')[1:]  # Skip header
-                
-                for snap_line in snap_lines:
-                    parts = snap_line.strip().split('|')
-                    if len(parts) >= 6:
-                        id_part = parts[0].strip()
-                        type_part = parts[1].strip()
-                        pre_num = parts[2].strip() if parts[2].strip() != '-' else None
-                        description = parts[5].strip() if len(parts) > 5 else ''
-                        
-                        # Extract date
-                        date_part = parts[3].strip() if len(parts) > 3 else ''
-                        user_part = parts[4].strip() if len(parts) > 4 else ''
-                        
-                        snapshots.append({
-                            'id': id_part,
-                            'type': type_part,
-                            'pre_num': pre_num,
-                            'description': description,
-                            'date': date_part,
-                            'user_name': user_part,
-                            'used_space': 0,  # Would need additional command to get this
-                            'config': config
-                        })
-            except:
+        for config, result in zip(configs, results):
+            if isinstance(result, Exception) or result.returncode != 0:
                 continue  # Skip if config has issues
                 
+            # Read from a stream so quoted fields may span lines
+            for row in csv.reader(io.StringIO(result.stdout)):
+                if len(row) < 7:
+                    continue
+                snapshots.append({
+                    'id': row[0],
+                    'type': row[1],
+                    'pre_num': row[2] or None,
+                    'description': row[6],
+                    'date': row[3],
+                    'user_name': row[4],
+                    'used_space': int(row[5]) if row[5].isdigit() else None,
+                    'config': config
+                })
+                
         return snapshots
     except Exception as e:
         print(f"Error getting snapshots: {e}")
         return []
 
-def get_io_stats():
+# One device's counters; encoded as an object by _json
+IOStat = collections.namedtuple(
+    'IOStat', 'device read_count write_count read_bytes write_bytes read_time write_time')
+
+def parse_diskstat_line(line):
+    """Convert a /proc/diskstats line into I/O statistics"""
+    fields = line.split()
+    return IOStat(
+        fields[2],
+        int(fields[3]),
+        int(fields[7]),
+        int(fields[5]) * 512,  # diskstats counts 512-byte sectors
+        int(fields[9]) * 512,
+        int(fields[6]),
+        int(fields[10]))
+
+@ttl_cache(seconds=30)
+async def get_mounted_devices():
+    """Get the base names of devices backing a mounted filesystem"""
+    partitions = await asyncio.get_running_loop().run_in_executor(None, psutil.disk_partitions)
+    return frozenset(partition.device.split('/')[-1] for partition in partitions)
+
+async def get_io_stats():
     """Get I/O statistics for devices"""
     try:
-        io_stats = []
-        partitions = psutil.disk_partitions()
+        # Only report devices backing a mounted filesystem
+        mounted = await get_mounted_devices()
         
-        for partition in partitions:
-            try:
-                device_name = partition.device.split('/')[-1]  # Get base device name
-                stats = psutil.disk_io_counters(perdisk=True)
-                
-                if device_name in stats:
-                    stat = stats[device_name]
-                    io_stats.append({
-                        'device': device_name,
-                        'read_count': stat.read_count,
-                        'write_count': stat.write_count,
-                        'read_bytes': stat.read_bytes,
-                        'write_bytes': stat.write_bytes,
-                        'read_time': stat.read_time,
-                        'write_time': stat.write_time
-                    })
-            except:
-                continue
-                
-        return io_stats
-    except Exception as e:
+        lines = read_proc('/proc/diskstats').splitlines()
+        
+        # Check the device name before parsing so unmounted devices cost one split
+        return [parse_diskstat_line(line) for line in lines if line.split(None, 3)[2] in mounted]
+    except (OSError, IndexError, ValueError) as e:
         print(f"Error getting IO stats: {e}")
         return []
 
+def format_bytes(num):
+    """Format a byte count like '1.5 GB'"""
+    if not num:
+        return '0 Bytes'
+    sizes = ['Bytes', 'KB', 'MB', 'GB', 'TB']
+    i = min(int(math.log(num, 1024)), len(sizes) - 1)
+    return f"{round(num / 1024 ** i, 2):g} {sizes[i]}"
+
+# <tr> row templates for each dashboard table, compiled once at import.
+# Values reach the onclick handlers through data-* attributes: autoescaping
+# does not make a value safe inside a JavaScript string in an attribute.
+_rows_env = jinja2.Environment(autoescape=True)
+_rows_env.filters['format_bytes'] = format_bytes
+ROW_TEMPLATES = {name: _rows_env.from_string(source) for name, source in {
+    'btrfs': '''{% for fs in rows %}
+<tr>
+    <td>{{ fs.id }}</td>
+    <td>{{ fs.label or '-' }}</td>
+    <td>{{ fs.uuid }}</td>
+    <td>{{ fs.devices | length }}</td>
+    <td>{{ fs.total_size | format_bytes }}</td>
+    <td>{{ fs.used | format_bytes }}</td>
+    <td>{{ fs.free | format_bytes }}</td>
+    <td>{{ fs.status }}</td>
+    <td>{{ fs.mount_point or '-' }}</td>
+    <td>{{ fs.mount_options or '-' }}</td>
+    <td>
+        <button class="btn" data-uuid="{{ fs.uuid }}" onclick="mountFs(this.dataset.uuid)">Mount</button>
+        <button class="btn" data-uuid="{{ fs.uuid }}" onclick="umountFs(this.dataset.uuid)">Unmount</button>
+    </td>
+</tr>
+{% endfor %}''',
+    'devices': '''{% for dev in rows %}
+<tr>
+    <td>{{ dev.name }}</td>
+    <td>{{ dev.size | format_bytes }}</td>
+    <td>{{ dev.type }}</td>
+    <td>{{ dev.mount_point or '-' }}</td>
+    <td>{{ dev.fstype or '-' }}</td>
+    <td>{{ dev.model or '-' }}</td>
+    <td>{{ dev.serial or '-' }}</td>
+    <td>
+        <button class="btn" data-device="{{ dev.name }}" onclick="addDeviceToBtrfs(this.dataset.device)" {{ '' if dev.fstype == 'btrfs' else 'disabled' }}>Add to Btrfs</button>
+    </td>
+</tr>
+{% endfor %}''',
+    'raid': '''{% for raid in rows %}
+<tr>
+    <td>{{ raid.fs }}</td>
+    <td>{{ raid.data_profile }}</td>
+    <td>{{ raid.metadata_profile }}</td>
+    <td>{{ raid.global_reserve | format_bytes }}</td>
+    <td>
+        <select>
+            <option value="">Change RAID...</option>
+            <option value="single">Single</option>
+            <option value="raid0">RAID0</option>
+            <option value="raid1">RAID1</option>
+            <option value="raid5">RAID5</option>
+            <option value="raid6">RAID6</option>
+            <option value="raid10">RAID10</option>
+        </select>
+        <button class="btn" data-fs="{{ raid.fs }}" onclick="changeRaid(this.dataset.fs, this.previousElementSibling.value)">Apply</button>
+    </td>
+</tr>
+{% endfor %}''',
+    'snapshots': '''{% for snap in rows %}
+<tr>
+    <td>{{ snap.id }}</td>
+    <td>{{ snap.type }}</td>
+    <td>{{ snap.pre_num or '-' }}</td>
+    <td>{{ snap.description }}</td>
+    <td>{{ snap.date }}</td>
+    <td>{{ snap.user_name }}</td>
+    <td>{{ '-' if snap.used_space is none else snap.used_space | format_bytes }}</td>
+    <td>
+        <button class="btn" data-config="{{ snap.config }}" data-id="{{ snap.id }}" onclick="deleteSnapshot(this.dataset.config, this.dataset.id)">Delete</button>
+    </td>
+</tr>
+{% endfor %}''',
+    'io': '''{% for io in rows %}
+<tr>
+    <td>{{ io.device }}</td>
+    <td>{{ io.read_count }}</td>
+    <td>{{ io.write_count }}</td>
+    <td>{{ io.read_bytes | format_bytes }}</td>
+    <td>{{ io.write_bytes | format_bytes }}</td>
+    <td>{{ io.read_time }}</td>
+    <td>{{ io.write_time }}</td>
+</tr>
+{% endfor %}''',
+}.items()}
+
+def render_rows(table, rows):
+    """Render the <tr> rows of a dashboard table"""
+    return ROW_TEMPLATES[table].render(rows=rows)
+
+# Seconds between samples of system info and I/O counters
+SAMPLE_INTERVAL = 1
+
+# Latest sample from the background sampler; swapped as a whole, never mutated
+_samples = {}
+_sampler_task = None
+
+async def sample_metrics():
+    """Sample system info and I/O counters every SAMPLE_INTERVAL seconds"""
+    global _samples
+    loop = asyncio.get_running_loop()
+    next_tick = loop.time()
+    while True:
+        try:
+            sysinfo, io_stats = await asyncio.gather(get_system_info(), get_io_stats())
+            _samples = {'sysinfo': sysinfo, 'io': io_stats}
+        except Exception as e:
+            print(f"Error sampling metrics: {e}")
+        # Schedule against absolute ticks so the cadence does not drift
+        next_tick += SAMPLE_INTERVAL
+        await asyncio.sleep(max(next_tick - loop.time(), 0))
+
+async def latest_system_info():
+    """Get the latest sampled system information"""
+    samples = _samples
+    return samples['sysinfo'] if samples else await get_system_info()
+
+async def latest_io_stats():
+    """Get the latest sampled I/O statistics"""
+    samples = _samples
+    return samples['io'] if samples else await get_io_stats()
+
+@app.before_serving
+async def start_sampler():
+    global _sampler_task
+    _sampler_task = asyncio.ensure_future(sample_metrics())
+
+@app.after_serving
+async def stop_sampler():
+    _sampler_task.cancel()
+    for f in _proc_files.values():
+        f.close()
+    _proc_files.clear()
+
+# Seconds between pushes on /api/stream
+STREAM_INTERVAL = 20
+
+async def build_tables():
+    """Collect the data for the tables backed by cached collectors"""
+    btrfs, devices, raid, snapshots = await asyncio.gather(
+        get_btrfs_filesystems(),
+        get_block_devices(),
+        get_raid_status(),
+        get_snapshots()
+    )
+    return {
+        'btrfs': btrfs,
+        'devices': devices,
+        'raid': raid,
+        'snapshots': snapshots
+    }
+
+async def build_all():
+    """Collect the data for every dashboard table"""
+    sysinfo, tables, io_stats = await asyncio.gather(
+        latest_system_info(),
+        build_tables(),
+        latest_io_stats()
+    )
+    return {'sysinfo': sysinfo, **tables, 'io': io_stats}
+
+def _json_default(obj):
+    """Encode the namedtuples orjson does not handle, such as IOStat"""
+    if hasattr(obj, '_asdict'):
+        return obj._asdict()
+    raise TypeError(f'Cannot encode {type(obj).__name__} as JSON')
+
+def _json(obj):
+    """Build a JSON response, encoded with orjson"""
+    return app.response_class(orjson.dumps(obj, default=_json_default), mimetype='application/json')
+
+# Whitelists for request values that end up on a command line
+UUID_RE = re.compile(r'[0-9a-fA-F-]{32,36}')
+DEVICE_RE = re.compile(r'(?!.*\.\.)(?:/dev/)?[A-Za-z0-9][A-Za-z0-9/_.:-]*')
+CONFIG_RE = re.compile(r'[A-Za-z0-9][A-Za-z0-9_.-]*')
+MOUNT_POINT_RE = re.compile(r'/[^\0]*')
+SNAPSHOT_ID_RE = re.compile(r'\d+')
+# Profiles balance can convert both data and metadata to
+RAID_PROFILES = ('single', 'raid0', 'raid1', 'raid5', 'raid6', 'raid10')
+
+def is_valid(pattern, value):
+    """Check that a request value is a string matching pattern in full"""
+    return isinstance(value, str) and pattern.fullmatch(value) is not None
+
+def device_node(device):
+    """Turn a validated device name like 'sdb' into its /dev path"""
+    return device if device.startswith('/dev/') else f'/dev/{device}'
+
 @app.route('/')
-def index():
-    return render_template_string(HTML_TEMPLATE)
+async def index():
+    # The page only changes on upgrade; its data arrives over /api/stream
+    headers = {'Vary': 'Accept-Encoding', 'Cache-Control': 'public, max-age=300'}
+    if 'gzip' in request.headers.get('Accept-Encoding', ''):
+        return Response(INDEX_HTML_GZIP, mimetype='text/html',
+                        headers={**headers, 'Content-Encoding': 'gzip'})
+    return Response(INDEX_HTML, mimetype='text/html', headers=headers)
 
 @app.route('/api/sysinfo')
-def api_sysinfo():
-    return jsonify(get_system_info())
+async def api_sysinfo():
+    return _json(await latest_system_info())
 
 @app.route('/api/btrfs')
-def api_btrfs():
-    return jsonify(get_btrfs_filesystems())
+async def api_btrfs():
+    return _json(await get_btrfs_filesystems())
 
 @app.route('/api/devices')
-def api_devices():
-    return jsonify(get_block_devices())
+async def api_devices():
+    return _json(await get_block_devices())
 
 @app.route('/api/raid')
-def api_raid():
-    return jsonify(get_raid_status())
+async def api_raid():
+    return _json(await get_raid_status())
 
 @app.route('/api/snapshots')
-def api_snapshots():
-    return jsonify(get_snapshots())
+async def api_snapshots():
+    return _json(await get_snapshots())
 
 @app.route('/api/io')
-def api_io():
-    return jsonify(get_io_stats())
+async def api_io():
+    return _json(await latest_io_stats())
+
+@app.route('/api/<table>.html')
+async def api_table_rows(table):
+    collectors = {
+        'btrfs': get_btrfs_filesystems,
+        'devices': get_block_devices,
+        'raid': get_raid_status,
+        'snapshots': get_snapshots,
+        'io': latest_io_stats
+    }
+    if table not in collectors:
+        return _json({'error': f'Unknown table: {table}'}), 404
+    return Response(render_rows(table, await collectors[table]()), mimetype='text/html')
+
+@app.route('/api/all')
+async def api_all():
+    # sysinfo and io change with every sample, so they stay on /api/sysinfo
+    # and /api/io; otherwise the ETag would change every second
+    body = orjson.dumps(await build_tables(), default=_json_default)
+    etag = hashlib.blake2b(body, digest_size=8).hexdigest()
+    # Pollers that already hold this payload get an empty 304
+    headers = {'ETag': f'"{etag}"', 'Cache-Control': 'no-cache'}
+    if request.if_none_match.contains_weak(etag):
+        return Response(b'', 304, headers=headers)
+    return app.response_class(body, mimetype='application/json', headers=headers)
+
+@app.route('/api/stream')
+async def api_stream():
+    async def events():
+        while True:
+            data = await build_all()
+            payload = {'sysinfo': data.pop('sysinfo')}
+            payload.update((table, render_rows(table, rows)) for table, rows in data.items())
+            yield b"data: " + orjson.dumps(payload) + b"\n\n"
+            await asyncio.sleep(STREAM_INTERVAL)
+    
+    response = Response(events(), mimetype='text/event-stream', headers={'Cache-Control': 'no-cache'})
+    # The stream is open-ended, so it must not hit Quart's response timeout
+    response.timeout = None
+    return response
+
+@app.route('/api/job/<job_id>')
+async def api_job(job_id):
+    job = _jobs.get(job_id)
+    if job is None:
+        return _json({'error': f'Unknown job: {job_id}'}), 404
+    return _json({key: value for key, value in job.items() if key != 'finished'})
 
 @app.route('/api/mount', methods=['POST'])
-def api_mount():
-    data = request.json
+async def api_mount():
+    data = await request.get_json(silent=True)
+    if not isinstance(data, dict):
+        return _json({'error': 'Request body must be a JSON object'}), 400
     uuid = data.get('uuid')
+    if not is_valid(UUID_RE, uuid):
+        return _json({'error': f'Invalid UUID: {uuid}'}), 400
     
     # Find the device with this UUID
     try:
-        result = subprocess.run(['blkid', '-U', uuid], capture_output=True, text=True)
-        device_path = result.stdout.strip()
+        device_path = device_for_uuid(uuid)
         
         if not device_path:
-            return jsonify({'error': f'Device with UUID {uuid} not found'}), 404
+            return _json({'error': f'Device with UUID {uuid} not found'}), 404
             
         # Mount the device (assuming it's btrfs)
         # First create a temporary mount point or use a standard one
         mount_point = f'/mnt/btrfs_{uuid[:8]}'
         os.makedirs(mount_point, exist_ok=True)
         
-        result = subprocess.run(['mount', device_path, mount_point], capture_output=True, text=True)
+        result = await run_process(['mount', device_path, mount_point])
         if result.returncode == 0:
-            return jsonify({'message': f'Successfully mounted {device_path} to {mount_point}'})
+            invalidate_cache('get_btrfs_mounts', 'get_btrfs_filesystems', 'get_block_devices',
+                             'get_raid_status', 'get_mounted_devices')
+            return _json({'message': f'Successfully mounted {device_path} to {mount_point}'})
         else:
-            return jsonify({'error': f'Mount failed: {result.stderr}'}), 500
+            return _json({'error': f'Mount failed: {result.stderr}'}), 500
     except Exception as e:
-        return jsonify({'error': str(e)}), 500
+        return _json({'error': str(e)}), 500
 
 @app.route('/api/umount', methods=['POST'])
-def api_umount():
-    data = request.json
+async def api_umount():
+    data = await request.get_json(silent=True)
+    if not isinstance(data, dict):
+        return _json({'error': 'Request body must be a JSON object'}), 400
     uuid = data.get('uuid')
+    if not is_valid(UUID_RE, uuid):
+        return _json({'error': f'Invalid UUID: {uuid}'}), 400
     
     try:
         # Find the mount point for this UUID
-        result = subprocess.run(['findmnt', '-t', 'btrfs', '-n', '-o', 'TARGET,SOURCE'], 
-                                capture_output=True, text=True)
-        
-        mount_point = None
-        for line in result.stdout.strip().split('\n'):
-            if uuid in line:
-                mount_point = line.split()[0]
-                break
+        mount_point = (await get_btrfs_mounts()).get(uuid, {}).get('target')
         
         if not mount_point:
-            return jsonify({'error': f'No mounted filesystem found with UUID {uuid}'}), 404
+            return _json({'error': f'No mounted filesystem found with UUID {uuid}'}), 404
             
-        result = subprocess.run(['umount', mount_point], capture_output=True, text=True)
+        result = await run_process(['umount', mount_point])
         if result.returncode == 0:
-            return jsonify({'message': f'Successfully unmounted {mount_point}'})
+            invalidate_cache('get_btrfs_mounts', 'get_btrfs_filesystems', 'get_block_devices',
+                             'get_raid_status', 'get_mounted_devices')
+            return _json({'message': f'Successfully unmounted {mount_point}'})
         else:
-            return jsonify({'error': f'Unmount failed: {result.stderr}'}), 500
+            return _json({'error': f'Unmount failed: {result.stderr}'}), 500
     except Exception as e:
-        return jsonify({'error': str(e)}), 500
+        return _json({'error': str(e)}), 500
 
 @app.route('/api/add-device', methods=['POST'])
-def api_add_device():
-    data = request.json
+async def api_add_device():
+    data = await request.get_json(silent=True)
+    if not isinstance(data, dict):
+        return _json({'error': 'Request body must be a JSON object'}), 400
     device = data.get('device')
     fs_uuid = data.get('fs_uuid')
+    fs_mount_point = data.get('mount_point')
+    if not is_valid(DEVICE_RE, device):
+        return _json({'error': f'Invalid device: {device}'}), 400
+    if fs_mount_point is not None and not is_valid(MOUNT_POINT_RE, fs_mount_point):
+        return _json({'error': f'Invalid mount point: {fs_mount_point}'}), 400
+    if fs_mount_point is None and not is_valid(UUID_RE, fs_uuid):
+        return _json({'error': f'Invalid UUID: {fs_uuid}'}), 400
+    device = device_node(device)
     
     try:
-        # Find the device path by UUID
-        result = subprocess.run(['blkid', '-U', fs_uuid], capture_output=True, text=True)
-        fs_device = result.stdout.strip()
-        
-        if not fs_device:
-            return jsonify({'error': f'Filesystem with UUID {fs_uuid} not found'}), 404
-            
-        # Get the mount point for this filesystem
-        result = subprocess.run(['findmnt', '-t', 'btrfs', '-n', '-o', 'TARGET,SOURCE'], 
-                                capture_output=True, text=True)
-        
-        fs_mount_point = None
-        for line in result.stdout.strip().split('\n'):
-            if fs_uuid in line:
-                fs_mount_point = line.split()[0]
-                break
-        
+        # Callers that already know the mount point skip the lookup
         if not fs_mount_point:
-            return jsonify({'error': f'Filesystem with UUID {fs_uuid} is not mounted'}), 400
+            # Find the device path by UUID
+            if not device_for_uuid(fs_uuid):
+                return _json({'error': f'Filesystem with UUID {fs_uuid} not found'}), 404
+                
+            # Get the mount point for this filesystem
+            fs_mount_point = (await get_btrfs_mounts()).get(fs_uuid, {}).get('target')
+            
+            if not fs_mount_point:
+                return _json({'error': f'Filesystem with UUID {fs_uuid} is not mounted'}), 400
             
         # Add the device to the btrfs filesystem
-        result = subprocess.run(['btrfs', 'device', 'add', device, fs_mount_point], 
-                                capture_output=True, text=True)
+        result = await run_process(['btrfs', 'device', 'add', device, fs_mount_point])
         
         if result.returncode == 0:
-            return jsonify({'message': f'Successfully added {device} to Btrfs filesystem'})
+            invalidate_cache('get_btrfs_filesystems', 'get_block_devices', 'get_raid_status')
+            return _json({'message': f'Successfully added {device} to Btrfs filesystem'})
         else:
-            return jsonify({'error': f'Adding device failed: {result.stderr}'}), 500
+            return _json({'error': f'Adding device failed: {result.stderr}'}), 500
     except Exception as e:
-        return jsonify({'error': str(e)}), 500
+        return _json({'error': str(e)}), 500
 
 @app.route('/api/change-raid', methods=['POST'])
-def api_change_raid():
-    data = request.json
-    filesystem = data.get('filesystem')  # This should be the mount point
+async def api_change_raid():
+    data = await request.get_json(silent=True)
+    if not isinstance(data, dict):
+        return _json({'error': 'Request body must be a JSON object'}), 400
+    # 'filesystem' is the older name for the mount point
+    filesystem = data.get('mount_point', data.get('filesystem'))
+    fs_uuid = data.get('fs_uuid')
     profile = data.get('profile')
+    if filesystem is not None and not is_valid(MOUNT_POINT_RE, filesystem):
+        return _json({'error': f'Invalid mount point: {filesystem}'}), 400
+    if filesystem is None and not is_valid(UUID_RE, fs_uuid):
+        return _json({'error': f'Invalid UUID: {fs_uuid}'}), 400
+    if profile not in RAID_PROFILES:
+        return _json({'error': f'Invalid RAID profile: {profile}'}), 400
     
     try:
-        # Convert profile to btrfs format (need to specify data and metadata profiles)
-        valid_profiles = ['single', 'raid0', 'raid1', 'raid5', 'raid6', 'raid10']
-        if profile not in valid_profiles:
-            return jsonify({'error': f'Invalid RAID profile: {profile}'}), 400
-        
-        # Change the RAID profile
-        result = subprocess.run(['btrfs', 'filesystem', 'resize', f'{profile}:', filesystem], 
-                                capture_output=True, text=True)
+        if not filesystem:
+            filesystem = (await get_btrfs_mounts()).get(fs_uuid, {}).get('target')
+            if not filesystem:
+                return _json({'error': f'Filesystem with UUID {fs_uuid} is not mounted'}), 400
         
-        if result.returncode == 0:
-            return jsonify({'message': f'Successfully changed RAID profile to {profile}'})
-        else:
-            # Try alternative command syntax
-            result_alt = subprocess.run(['btrfs', 'balance', 'start', '-dconvert=' + profile, 
-                                         '-mconvert=' + profile, filesystem], 
-                                        capture_output=True, text=True)
-            if result_alt.returncode == 0:
-                return jsonify({'message': f'Successfully started RAID conversion to {profile}'})
-            else:
-                return jsonify({'error': f'RAID change failed: {result.stderr}\nAlternative: {result_alt.stderr}'}), 500
+        # Converting rewrites every chunk through a balance, which can take
+        # hours, so it runs as a background job
+        job_id = start_job(['btrfs', 'balance', 'start', '-dconvert=' + profile,
+                            '-mconvert=' + profile, filesystem],
+                           f'Successfully changed RAID profile to {profile}',
+                           'RAID change failed', 'get_btrfs_filesystems', 'get_raid_status')
+        return _json({'job_id': job_id,
+                      'message': f'Started RAID conversion to {profile}'}), 202
     except Exception as e:
-        return jsonify({'error': str(e)}), 500
+        return _json({'error': str(e)}), 500
 
 @app.route('/api/delete-snapshot', methods=['POST'])
-def api_delete_snapshot():
-    data = request.json
+async def api_delete_snapshot():
+    data = await request.get_json(silent=True)
+    if not isinstance(data, dict):
+        return _json({'error': 'Request body must be a JSON object'}), 400
     config = data.get('config')
     snap_id = data.get('id')
+    if not is_valid(CONFIG_RE, config):
+        return _json({'error': f'Invalid Snapper configuration: {config}'}), 400
+    if not is_valid(SNAPSHOT_ID_RE, str(snap_id)):
+        return _json({'error': f'Invalid snapshot ID: {snap_id}'}), 400
     
     try:
-        result = subprocess.run(['snapper', '-c', config, 'delete', str(snap_id)], 
-                                capture_output=True, text=True)
+        result = await run_process(['snapper', '-c', config, 'delete', str(snap_id)])
         
         if result.returncode == 0:
-            return jsonify({'message': f'Successfully deleted snapshot {snap_id} from config {config}'})
+            invalidate_cache('get_snapshots')
+            return _json({'message': f'Successfully deleted snapshot {snap_id} from config {config}'})
         else:
-            return jsonify({'error': f'Deletion failed: {result.stderr}'}), 500
+            return _json({'error': f'Deletion failed: {result.stderr}'}), 500
     except Exception as e:
-        return jsonify({'error': str(e)}), 500
+        return _json({'error': str(e)}), 500
 
 @app.route('/api/create-btrfs', methods=['POST'])
-def api_create_btrfs():
-    data = request.json
+async def api_create_btrfs():
+    data = await request.get_json(silent=True)
+    if not isinstance(data, dict):
+        return _json({'error': 'Request body must be a JSON object'}), 400
     device = data.get('device')
-    label = data.get('label', '')
+    label = data.get('label') or ''  # The UI sends null when the prompt is cancelled
+    if not is_valid(DEVICE_RE, device):
+        return _json({'error': f'Invalid device: {device}'}), 400
+    if not isinstance(label, str):
+        return _json({'error': f'Invalid label: {label}'}), 400
+    device = device_node(device)
     
     try:
         cmd = ['mkfs.btrfs']
@@ -941,31 +1313,37 @@ def api_create_btrfs():
             cmd.extend(['-L', label])
         cmd.append(device)
         
-        result = subprocess.run(cmd, capture_output=True, text=True)
-        
-        if result.returncode == 0:
-            return jsonify({'message': f'Successfully created Btrfs filesystem on {device}'})
-        else:
-            return jsonify({'error': f'Creation failed: {result.stderr}'}), 500
+        job_id = start_job(cmd, f'Successfully created Btrfs filesystem on {device}',
+                           'Creation failed', 'get_btrfs_filesystems', 'get_block_devices',
+                           'get_raid_status', 'get_mounted_devices')
+        return _json({'job_id': job_id,
+                      'message': f'Creating Btrfs filesystem on {device}'}), 202
     except Exception as e:
-        return jsonify({'error': str(e)}), 500
+        return _json({'error': str(e)}), 500
 
 @app.route('/api/create-snapshot', methods=['POST'])
-def api_create_snapshot():
-    data = request.json
+async def api_create_snapshot():
+    data = await request.get_json(silent=True)
+    if not isinstance(data, dict):
+        return _json({'error': 'Request body must be a JSON object'}), 400
     config = data.get('config')
     description = data.get('description', 'Created via Web UI')
+    if not is_valid(CONFIG_RE, config):
+        return _json({'error': f'Invalid Snapper configuration: {config}'}), 400
+    if not isinstance(description, str):
+        return _json({'error': f'Invalid description: {description}'}), 400
     
     try:
-        result = subprocess.run(['snapper', '-c', config, 'create', '--description', description], 
-                                capture_output=True, text=True)
+        result = await run_process(['snapper', '-c', config, 'create', '--description', description])
         
         if result.returncode == 0:
-            return jsonify({'message': f'Successfully created snapshot in config {config}'})
+            invalidate_cache('get_snapshots')
+            return _json({'message': f'Successfully created snapshot in config {config}'})
         else:
-            return jsonify({'error': f'Creation failed: {result.stderr}'}), 500
+            return _json({'error': f'Creation failed: {result.stderr}'}), 500
     except Exception as e:
-        return jsonify({'error': str(e)}), 500
+        return _json({'error': str(e)}), 500
 
 if __name__ == '__main__':
+    # Development server only; the service runs under Hypercorn (see systemd/btrfs-manager.service)
     app.run(host='0.0.0.0', port=8787, debug=False)
\ No newline at end of file
@@ -19,14 +19,14 @@ sudo chown "$USER":"$USER" "$WEB_TOOL_DIR"
 # Install required packages (for openSUSE)
 if command -v zypper &> /dev/null; then
     echo "Installing required packages..."
-    sudo zypper install -y python3 python3-pip python3-flask btrfsprogs snapper python3-psutil
+    sudo zypper install -y python3 python3-pip python3-Quart python3-Hypercorn python3-Jinja2 btrfsprogs snapper python3-psutil python3-orjson
 elif command -v apt-get &> /dev/null; then
     echo "Installing required packages..."
     sudo apt-get update
-    sudo apt-get install -y python3 python3-pip python3-flask btrfs-tools snapper python3-psutil
+    sudo apt-get install -y python3 python3-pip python3-quart python3-hypercorn python3-jinja2 btrfs-tools snapper python3-psutil python3-orjson
 elif command -v yum &> /dev/null; then
     echo "Installing required packages..."
-    sudo yum install -y python3 python3-pip python3-flask btrfs-progs snapper python3-psutil
+    sudo yum install -y python3 python3-pip python3-quart python3-hypercorn python3-jinja2 btrfs-progs snapper python3-psutil python3-orjson
 fi
 
 # Copy application files
@@ -48,7 +48,7 @@ Type=simple
 User=root
 Group=root
 WorkingDirectory=$WEB_TOOL_DIR
-ExecStart=/usr/bin/python3 $WEB_TOOL_DIR/btrfs-manager.py
+ExecStart=/usr/bin/python3 -m hypercorn btrfs-manager:app --bind 0.0.0.0:$PORT --workers 1 --keep-alive 75
 Restart=always
 RestartSec=3
 